@@ -1,23 +1,48 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateIndex
 
 from config import config
 
-# 创建数据库引擎
-engine = create_engine(
-    config.DATABASE_URL,
-    echo=config.DEBUG
-)
+# 连接池配置（内存SQLite只能使用单连接，保持默认）
+database_url = make_url(config.DATABASE_URL)
+engine_options = {}
+if not (database_url.get_backend_name() == "sqlite" and database_url.database in (None, "", ":memory:")):
+    engine_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+    }
 
-# 创建异步数据库引擎
+# SQLite连接级预编译语句缓存（MySQL驱动不使用服务端预编译语句）
+if database_url.get_backend_name() == "sqlite":
+    engine_options["connect_args"] = {"cached_statements": config.DB_STATEMENT_CACHE_SIZE}
+
+# 创建异步数据库引擎（query_cache_size 控制SQL编译缓存，重复查询无需重新编译）
 async_engine = create_async_engine(
     config.DATABASE_URL,
-    echo=config.DEBUG
+    echo=config.DEBUG,
+    query_cache_size=config.DB_QUERY_CACHE_SIZE,
+    **engine_options
 )
 
+# SQLite启用WAL模式，读写互不阻塞
+if async_engine.dialect.name == "sqlite":
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 AsyncSessionLocal = async_sessionmaker(
     async_engine, 
     class_=AsyncSession, 
@@ -27,6 +52,27 @@ AsyncSessionLocal = async_sessionmaker(
 # 创建基础模型类
 Base = declarative_base()
 
+# MySQL 重复创建索引的错误码（Duplicate key name）
+MYSQL_DUPLICATE_KEY_NAME = 1061
+
+def create_missing_indexes(connection):
+    """为已存在的表补建模型中新增的索引（create_all不会修改已有表）
+    
+    多个worker同时启动时会并发执行，检查与创建之间可能被其他进程抢先创建：
+    支持 IF NOT EXISTS 的数据库直接使用该语法，MySQL 则忽略索引已存在的错误
+    """
+    if_not_exists = connection.dialect.name in ("sqlite", "postgresql")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if if_not_exists:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+                continue
+            try:
+                index.create(connection, checkfirst=True)
+            except OperationalError as e:
+                if e.orig.args[0] != MYSQL_DUPLICATE_KEY_NAME:
+                    raise
+
 # 依赖注入：获取数据库会话
 async def get_db():
     """获取异步数据库会话"""
@@ -35,11 +81,3 @@ async def get_db():
             yield session
         finally:
             await session.close()
-
-def get_sync_db():
-    """获取同步数据库会话"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
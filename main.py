@@ -1,13 +1,16 @@
 from fastapi import FastAPI, HTTPException
+from slowapi.errors import RateLimitExceeded
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from contextlib import asynccontextmanager
 
 from config import config
-from database import engine, Base, AsyncSessionLocal, async_engine
-from routers import auth, user, account, family, admin, category
+from database import Base, AsyncSessionLocal, async_engine, create_missing_indexes
+from routers import auth, user, account, family, admin, category, batch
 from models import User
+from utils.limiter import limiter
+from utils.etag import ETagMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -17,10 +20,16 @@ async def lifespan(app: FastAPI):
     # 异步创建数据库表
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
     
     # 初始化系统管理员
     await init_admin()
     
+    # 输出密码哈希后端，确认加载的是原生扩展
+    from utils.auth import pwd_context
+    for scheme in pwd_context.schemes():
+        print(f"密码哈希后端: {scheme}/{pwd_context.handler(scheme).get_backend()}")
+    
     print("系统启动完成")
     yield
     
@@ -31,9 +40,13 @@ app = FastAPI(
     title=config.APP_NAME,
     version=config.VERSION,
     description="家庭账本H5应用后端API",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# 限流器
+app.state.limiter = limiter
+
 # CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -43,6 +56,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# GET响应ETag，内容未变化时返回304
+app.add_middleware(ETagMiddleware)
+
 # 路由注册
 app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(user.router, prefix="/api/user", tags=["用户"])
@@ -50,11 +66,12 @@ app.include_router(account.router, prefix="/api/account", tags=["账本"])
 app.include_router(family.router, prefix="/api/family", tags=["家庭"])
 app.include_router(admin.router, prefix="/api/admin", tags=["管理员"])
 app.include_router(category.router, prefix="/api/category", tags=["分类"])
+app.include_router(batch.router, prefix="/api/batch", tags=["批量请求"])
 
 # 全局异常处理
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -63,9 +80,20 @@ async def http_exception_handler(request, exc):
         }
     )
 
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exception_handler(request, exc):
+    return ORJSONResponse(
+        status_code=429,
+        content={
+            "success": False,
+            "message": "请求过于频繁，请稍后再试",
+            "code": 429
+        }
+    )
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -88,6 +116,7 @@ async def init_admin():
     from database import get_db
     from utils.auth import get_password_hash
     from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
     
     async with AsyncSessionLocal() as db:
         # 检查是否已存在系统管理员
@@ -100,12 +129,18 @@ async def init_admin():
             admin = User(
                 phone=config.ADMIN_PHONE,
                 name="系统管理员",
-                hashed_password=get_password_hash(config.ADMIN_PASSWORD),
+                hashed_password=await get_password_hash(config.ADMIN_PASSWORD),
                 role="system_admin",
                 is_active=True
             )
             db.add(admin)
-            await db.commit()
+            try:
+                await db.commit()
+            except IntegrityError:
+                # 多进程启动时可能已被其他工作进程创建
+                await db.rollback()
+                print("系统管理员已存在")
+                return
             print(f"系统管理员初始化成功 - 账号: {config.ADMIN_PHONE}, 密码: {config.ADMIN_PASSWORD}")
         else:
             print("系统管理员已存在")
@@ -115,5 +150,8 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=3001,
+        workers=1 if config.DEBUG else config.WORKERS,
+        loop="uvloop",
+        http="httptools",
         reload=config.DEBUG
     )
\ No newline at end of file
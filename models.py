@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -25,9 +25,9 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # 关联关系
-    family_memberships = relationship("FamilyMember", back_populates="user")
-    records = relationship("AccountRecord", back_populates="user")
+    # 关联关系（禁止隐式懒加载，需要时显式使用 selectinload 等预加载）
+    family_memberships = relationship("FamilyMember", back_populates="user", lazy="raise")
+    records = relationship("AccountRecord", back_populates="user", lazy="raise")
 
 class Family(Base):
     __tablename__ = "families"
@@ -58,6 +58,11 @@ class FamilyMember(Base):
     # 关联关系
     family = relationship("Family", back_populates="members")
     user = relationship("User", back_populates="family_memberships")
+    
+    __table_args__ = (
+        # 追加 family_id、role 列使按用户查询成员关系时只需访问索引
+        Index("ix_family_member_user_active", "user_id", "is_active", "family_id", "role"),
+    )
 
 class AccountRecord(Base):
     __tablename__ = "account_records"
@@ -76,6 +81,11 @@ class AccountRecord(Base):
     # 关联关系
     family = relationship("Family", back_populates="records")
     user = relationship("User", back_populates="records")
+    
+    __table_args__ = (
+        Index("ix_records_family_date", "family_id", "date"),
+        Index("ix_records_family_type_date", "family_id", "type", "date"),
+    )
 
 class Category(Base):
     __tablename__ = "categories"
@@ -93,4 +103,8 @@ class Category(Base):
     
     # 关联关系
     family = relationship("Family")
-    creator = relationship("User")
\ No newline at end of file
+    creator = relationship("User")
+    
+    __table_args__ = (
+        Index("ix_categories_family_active_type", "family_id", "is_active", "type"),
+    )
\ No newline at end of file
@@ -1,35 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, tuple_
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from database import get_db
 from schemas import AccountRecordCreate, AccountRecordUpdate, AccountRecordWithUser
-from utils.auth import get_current_active_user
-from models import AccountRecord, Family, FamilyMember, User, UserRole
+from utils.auth import get_current_active_user, get_current_family_id
+from models import AccountRecord, Family, User, UserRole
+from utils.cache import invalidate_admin_stats
 
 router = APIRouter()
 
-async def get_user_family_id(current_user: User, db: AsyncSession) -> Optional[int]:
-    """获取用户所在的家庭ID"""
-    stmt = select(FamilyMember.family_id).where(
-        FamilyMember.user_id == current_user.id,
-        FamilyMember.is_active == True
-    )
-    result = await db.execute(stmt)
-    family_id = result.scalar_one_or_none()
-    return family_id
+def record_to_dict(record: AccountRecord, user_name: Optional[str]) -> dict:
+    """格式化记账记录，type字段输出为小写枚举值"""
+    return {
+        "id": record.id,
+        "family_id": record.family_id,
+        "user_id": record.user_id,
+        "user_name": user_name or "未知用户",
+        "type": record.type.value,
+        "category": record.category,
+        "amount": record.amount,
+        "note": record.note,
+        "date": record.date,
+        "created_at": record.created_at
+    }
 
 @router.post("/", response_model=AccountRecordWithUser)
 async def create_record(
     record: AccountRecordCreate,
     current_user: User = Depends(get_current_active_user),
+    user_family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """创建记账记录"""
     # 验证用户是否为该家庭成员
-    user_family_id = await get_user_family_id(current_user, db)
     if user_family_id != record.family_id:
         raise HTTPException(
             status_code=403,
@@ -50,26 +57,11 @@ async def create_record(
     db.add(db_record)
     await db.commit()
     await db.refresh(db_record)
+    await invalidate_admin_stats()
     
-    # 关联用户信息
-    db_record.user_name = current_user.name
-    
-    # 返回格式化的数据，确保type字段为小写
-    result = {
-        "id": db_record.id,
-        "family_id": db_record.family_id,
-        "user_id": db_record.user_id,
-        "user_name": current_user.name,
-        "type": db_record.type.value if hasattr(db_record.type, 'value') else str(db_record.type).lower(),
-        "category": db_record.category,
-        "amount": db_record.amount,
-        "note": db_record.note,
-        "date": db_record.date,
-        "created_at": db_record.created_at
-    }
-    return result
+    return record_to_dict(db_record, current_user.name)
 
-@router.get("/", response_model=List[AccountRecordWithUser])
+@router.get("/", response_model=None)
 async def get_records(
     family_id: Optional[int] = None,
     record_type: Optional[str] = None,
@@ -78,13 +70,26 @@ async def get_records(
     end_date: Optional[datetime] = None,
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    after_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
     current_user: User = Depends(get_current_active_user),
+    user_family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取记账记录列表"""
+    """获取记账记录列表
+    
+    支持两种分页方式：传page按页码分页；传after_date和after_id（上一页最后一条记录的date和id）
+    按游标分页，翻页深度不影响查询性能。
+    """
+    if (after_date is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="after_date和after_id需要同时提供"
+        )
+    
     # 确定查询的家庭ID
     if family_id is None:
-        family_id = await get_user_family_id(current_user, db)
+        family_id = user_family_id
     
     if family_id is None:
         raise HTTPException(
@@ -93,7 +98,6 @@ async def get_records(
         )
     
     # 验证用户权限
-    user_family_id = await get_user_family_id(current_user, db)
     if user_family_id != family_id and current_user.role not in ["system_admin", "family_admin"]:
         raise HTTPException(
             status_code=403,
@@ -106,98 +110,64 @@ async def get_records(
     if record_type:
         conditions.append(AccountRecord.type == record_type)
     if category:
-        # 支持多个分类查询
-        if isinstance(category, list):
-            if category:  # 如果列表不为空
-                conditions.append(AccountRecord.category.in_(category))
-        else:  # 兼容单个分类的模糊查询
-            conditions.append(AccountRecord.category.like(f"%{category}%"))
+        # 支持多个分类查询，按分类名精确匹配以便使用索引
+        conditions.append(AccountRecord.category.in_(category))
     if start_date:
         conditions.append(AccountRecord.date >= start_date)
     if end_date:
         conditions.append(AccountRecord.date <= end_date)
+    if after_date is not None:
+        conditions.append(tuple_(AccountRecord.date, AccountRecord.id) < tuple_(after_date, after_id))
     
-    # 查询记录
-    stmt = select(AccountRecord).where(and_(*conditions))
-    stmt = stmt.order_by(AccountRecord.date.desc())
-    stmt = stmt.offset((page - 1) * size).limit(size)
+    # 查询记录，同时关联出记录人姓名
+    stmt = select(AccountRecord, User.name).outerjoin(User, User.id == AccountRecord.user_id)
+    stmt = stmt.where(and_(*conditions))
+    stmt = stmt.order_by(AccountRecord.date.desc(), AccountRecord.id.desc())
+    if after_date is None:
+        stmt = stmt.offset((page - 1) * size)
+    stmt = stmt.limit(size)
     
     result = await db.execute(stmt)
-    records = result.scalars().all()
     
-    # 添加用户名信息
-    records_with_user = []
-    for record in records:
-        user_stmt = select(User.name).where(User.id == record.user_id)
-        user_result = await db.execute(user_stmt)
-        user_name = user_result.scalar_one_or_none() or "未知用户"
-        
-        record_dict = {
-            "id": record.id,
-            "family_id": record.family_id,
-            "user_id": record.user_id,
-            "user_name": user_name,
-            "type": record.type.value if hasattr(record.type, 'value') else str(record.type).lower(),
-            "category": record.category,
-            "amount": record.amount,
-            "note": record.note,
-            "date": record.date,
-            "created_at": record.created_at
-        }
-        records_with_user.append(record_dict)
-    
-    return records_with_user
+    # 列表数据直接由orjson编码，跳过逐条的模型校验
+    return ORJSONResponse([record_to_dict(record, user_name) for record, user_name in result.all()])
 
 @router.get("/{record_id}", response_model=AccountRecordWithUser)
 async def get_record(
     record_id: int,
     current_user: User = Depends(get_current_active_user),
+    user_family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """获取单条记账记录"""
-    stmt = select(AccountRecord).where(AccountRecord.id == record_id)
+    stmt = select(AccountRecord, User.name).outerjoin(
+        User, User.id == AccountRecord.user_id
+    ).where(AccountRecord.id == record_id)
     result = await db.execute(stmt)
-    record = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not record:
+    if not row:
         raise HTTPException(
             status_code=404,
             detail="记录不存在"
         )
+    record, user_name = row
     
     # 验证权限
-    user_family_id = await get_user_family_id(current_user, db)
     if record.family_id != user_family_id and current_user.role not in ["system_admin", "family_admin"]:
         raise HTTPException(
             status_code=403,
             detail="您没有权限查看该记录"
         )
     
-    # 获取用户名
-    user_stmt = select(User.name).where(User.id == record.user_id)
-    user_result = await db.execute(user_stmt)
-    user_name = user_result.scalar_one_or_none() or "未知用户"
-    
-    # 返回格式化的数据，确保type字段为小写
-    result = {
-        "id": record.id,
-        "family_id": record.family_id,
-        "user_id": record.user_id,
-        "user_name": user_name,
-        "type": record.type.value if hasattr(record.type, 'value') else str(record.type).lower(),
-        "category": record.category,
-        "amount": record.amount,
-        "note": record.note,
-        "date": record.date,
-        "created_at": record.created_at
-    }
-    return result
+    return record_to_dict(record, user_name)
 
 @router.put("/{record_id}")
 async def update_record(
     record_id: int,
     record_update: AccountRecordUpdate,
     current_user: User = Depends(get_current_active_user),
+    user_family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """更新记账记录"""
@@ -212,7 +182,6 @@ async def update_record(
         )
     
     # 验证权限（只有记录创建者、家庭管理员、系统管理员可以修改）
-    user_family_id = await get_user_family_id(current_user, db)
     can_edit = (
         record.user_id == current_user.id or
         current_user.role in ["system_admin", "family_admin"]
@@ -238,6 +207,7 @@ async def update_record(
         record.note = record_update.note
     
     await db.commit()
+    await invalidate_admin_stats()
     
     return {"success": True, "message": "记录更新成功"}
 
@@ -245,6 +215,7 @@ async def update_record(
 async def delete_record(
     record_id: int,
     current_user: User = Depends(get_current_active_user),
+    user_family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """删除记账记录"""
@@ -259,7 +230,6 @@ async def delete_record(
         )
     
     # 验证权限（只有记录创建者、家庭管理员、系统管理员可以删除）
-    user_family_id = await get_user_family_id(current_user, db)
     can_delete = (
         record.user_id == current_user.id or
         current_user.role in ["system_admin", "family_admin"]
@@ -276,5 +246,6 @@ async def delete_record(
     
     await db.delete(record)
     await db.commit()
+    await invalidate_admin_stats()
     
     return {"success": True, "message": "记录删除成功"}
\ No newline at end of file
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from typing import List
+from sqlalchemy import select, func, delete
 
+from config import config
 from database import get_db
 from schemas import SystemStats, AdminUserCreate, User as UserSchema
-from utils.auth import get_system_admin
+from utils.auth import get_system_admin, invalidate_user_cache
 from models import User, Family, FamilyMember, AccountRecord
+from utils.cache import cache_get, cache_set, invalidate_admin_stats, invalidate_family_members, ADMIN_SYSTEM_STATS_KEY, ADMIN_ALL_FAMILIES_KEY
 
 router = APIRouter()
 
@@ -18,35 +20,30 @@ async def get_system_statistics(
     """获取系统统计数据"""
     print(f"DEBUG: /system-stats 被调用")
     """获取系统统计数据"""
+    cached = await cache_get(ADMIN_SYSTEM_STATS_KEY)
+    if cached is not None:
+        return cached
+    
+    # 用户数、家庭数、记录数、总金额合并为一次查询
+    stmt = select(
+        select(func.count(User.id)).scalar_subquery(),
+        select(func.count(Family.id)).scalar_subquery(),
+        select(func.count(AccountRecord.id)).scalar_subquery(),
+        select(func.coalesce(func.sum(AccountRecord.amount), 0)).scalar_subquery()
+    )
+    result = await db.execute(stmt)
+    total_users, total_families, total_records, total_amount = result.one()
     
-    # 统计总用户数
-    user_count_stmt = select(func.count(User.id))
-    user_result = await db.execute(user_count_stmt)
-    total_users = user_result.scalar() or 0
-    
-    # 统计总家庭数
-    family_count_stmt = select(func.count(Family.id))
-    family_result = await db.execute(family_count_stmt)
-    total_families = family_result.scalar() or 0
-    
-    # 统计总记录数
-    record_count_stmt = select(func.count(AccountRecord.id))
-    record_result = await db.execute(record_count_stmt)
-    total_records = record_result.scalar() or 0
-    
-    # 统计总金额
-    amount_stmt = select(func.sum(AccountRecord.amount))
-    amount_result = await db.execute(amount_stmt)
-    total_amount = amount_result.scalar() or 0
-    
-    return SystemStats(
+    stats = SystemStats(
         total_users=total_users,
         total_families=total_families,
         total_records=total_records,
         total_amount=float(total_amount)
     )
+    await cache_set(ADMIN_SYSTEM_STATS_KEY, stats.model_dump(), config.ADMIN_CACHE_TTL)
+    return stats
 
-@router.get("/family-admins", response_model=List[UserSchema])
+@router.get("/family-admins", response_model=None)
 async def get_family_admins(
     current_user: User = Depends(get_system_admin),
     db: AsyncSession = Depends(get_db)
@@ -56,7 +53,10 @@ async def get_family_admins(
     result = await db.execute(stmt)
     admins = result.scalars().all()
     
-    return list(admins)
+    # 只做一次模型转换，避免response_model重复校验
+    return ORJSONResponse([
+        UserSchema.model_validate(admin).model_dump(mode="json") for admin in admins
+    ])
 
 @router.post("/add-admin", response_model=UserSchema)
 async def add_family_admin(
@@ -82,7 +82,7 @@ async def add_family_admin(
     new_admin = User(
         phone=admin_data.phone,
         name=admin_data.name,
-        hashed_password=get_password_hash(admin_data.password),
+        hashed_password=await get_password_hash(admin_data.password),
         role=admin_data.role,
         is_active=True
     )
@@ -90,6 +90,7 @@ async def add_family_admin(
     db.add(new_admin)
     await db.commit()
     await db.refresh(new_admin)
+    await invalidate_admin_stats()
     
     return new_admin
 
@@ -116,25 +117,22 @@ async def remove_family_admin(
             detail="该用户不是家庭管理员"
         )
     
-    # 先删除相关的账本记录
-    record_stmt = select(AccountRecord).where(AccountRecord.user_id == admin_id)
-    record_result = await db.execute(record_stmt)
-    records = record_result.scalars().all()
-    
-    for record in records:
-        await db.delete(record)
+    # 先批量删除相关的账本记录
+    await db.execute(delete(AccountRecord).where(AccountRecord.user_id == admin_id))
     
-    # 删除相关的家庭成员关系
-    member_stmt = select(FamilyMember).where(FamilyMember.user_id == admin_id)
-    member_result = await db.execute(member_stmt)
-    members = member_result.scalars().all()
-    
-    for member in members:
-        await db.delete(member)
+    # 批量删除相关的家庭成员关系（先记下所在家庭，提交后清除这些家庭的成员列表缓存）
+    family_result = await db.execute(
+        select(FamilyMember.family_id).where(FamilyMember.user_id == admin_id)
+    )
+    family_ids = family_result.scalars().all()
+    await db.execute(delete(FamilyMember).where(FamilyMember.user_id == admin_id))
     
     # 删除用户
     await db.delete(admin)
     await db.commit()
+    invalidate_user_cache(admin_id)
+    await invalidate_admin_stats()
+    await invalidate_family_members(db, *family_ids)
     
     return {"success": True, "message": "家庭管理员移除成功"}
 
@@ -144,45 +142,52 @@ async def get_all_families(
     db: AsyncSession = Depends(get_db)
 ):
     """获取所有家庭列表"""
-    family_stmt = select(Family)
+    cached = await cache_get(ADMIN_ALL_FAMILIES_KEY)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
+    # 成员数和总金额分别预先按家庭聚合，避免成员与记录连接后金额被重复累加
+    member_count_subq = select(
+        FamilyMember.family_id,
+        func.count(FamilyMember.id).label("member_count")
+    ).where(
+        FamilyMember.is_active == True
+    ).group_by(FamilyMember.family_id).subquery()
+    
+    amount_subq = select(
+        AccountRecord.family_id,
+        func.sum(AccountRecord.amount).label("total_amount")
+    ).group_by(AccountRecord.family_id).subquery()
+    
+    family_stmt = select(
+        Family,
+        User.name,
+        func.coalesce(member_count_subq.c.member_count, 0),
+        func.coalesce(amount_subq.c.total_amount, 0)
+    ).outerjoin(
+        User, User.id == Family.created_by
+    ).outerjoin(
+        member_count_subq, member_count_subq.c.family_id == Family.id
+    ).outerjoin(
+        amount_subq, amount_subq.c.family_id == Family.id
+    )
     family_result = await db.execute(family_stmt)
-    families = family_result.scalars().all()
     
     families_data = []
-    for family in families:
-        # 获取家庭成员数量
-        member_count_stmt = select(func.count(FamilyMember.id)).where(
-            and_(
-                FamilyMember.family_id == family.id,
-                FamilyMember.is_active == True
-            )
-        )
-        member_result = await db.execute(member_count_stmt)
-        member_count = member_result.scalar() or 0
-        
-        # 获取家庭总金额
-        amount_stmt = select(func.sum(AccountRecord.amount)).where(
-            AccountRecord.family_id == family.id
-        )
-        amount_result = await db.execute(amount_stmt)
-        total_amount = amount_result.scalar() or 0
-        
-        # 获取创建者姓名
-        creator_stmt = select(User.name).where(User.id == family.created_by)
-        creator_result = await db.execute(creator_stmt)
-        admin_name = creator_result.scalar_one_or_none() or "未知"
-        
+    for family, admin_name, member_count, total_amount in family_result.all():
         families_data.append({
             "id": family.id,
             "name": family.name,
-            "admin_name": admin_name,
+            "admin_name": admin_name or "未知",
             "member_count": member_count,
             "total_amount": float(total_amount),
             "is_active": family.is_active,
             "created_at": family.created_at
         })
     
-    return {"success": True, "data": families_data}
+    response_data = {"success": True, "data": families_data}
+    await cache_set(ADMIN_ALL_FAMILIES_KEY, response_data, config.ADMIN_CACHE_TTL)
+    return ORJSONResponse(response_data)
 
 @router.post("/reset-user-password")
 async def reset_user_password(
@@ -191,7 +196,7 @@ async def reset_user_password(
     db: AsyncSession = Depends(get_db)
 ):
     """重置用户密码"""
-    from utils.auth import get_password_hash
+    from utils.auth import DEFAULT_PASSWORD_HASH
     
     stmt = select(User).where(User.phone == phone)
     result = await db.execute(stmt)
@@ -204,8 +209,9 @@ async def reset_user_password(
         )
     
     # 重置密码为默认密码
-    user.hashed_password = get_password_hash("123456")
+    user.hashed_password = DEFAULT_PASSWORD_HASH
     await db.commit()
+    invalidate_user_cache(user.id)
     
     return {"success": True, "message": "密码重置成功，新密码为 123456"}
 
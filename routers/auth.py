@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from database import get_db
-from schemas import UserLogin, Token, PasswordChange, PasswordReset, UserCreate
+from schemas import UserLogin, Token, PasswordChange, PasswordReset, UserCreate, SuccessResponse, User as UserSchema
 from utils.auth import (
     authenticate_user, 
     create_access_token, 
     get_current_user,
     get_password_hash,
-    verify_password
+    verify_password,
+    invalidate_user_cache,
+    DEFAULT_PASSWORD_HASH
 )
 from models import User
 from config import config
+from utils.limiter import limiter
 
 router = APIRouter()
 
@@ -40,7 +43,7 @@ async def register(
     new_user = User(
         phone=user_data.phone,
         name=user_data.name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash(user_data.password),
         role=UserRole.FAMILY_MEMBER,
         is_active=True
     )
@@ -62,7 +65,9 @@ async def register(
     }
 
 @router.post("/login", response_model=Token)
+@limiter.limit(config.LOGIN_RATE_LIMIT)
 async def login(
+    request: Request,
     form_data: UserLogin,
     db: AsyncSession = Depends(get_db)
 ):
@@ -100,14 +105,15 @@ async def change_password(
     db: AsyncSession = Depends(get_db)
 ):
     """修改密码"""
-    if not verify_password(password_data.old_password, current_user.hashed_password):
+    if not await verify_password(password_data.old_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="原密码错误"
         )
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await get_password_hash(password_data.new_password)
     await db.commit()
+    invalidate_user_cache(current_user.id)
     
     return {"success": True, "message": "密码修改成功"}
 
@@ -129,12 +135,13 @@ async def reset_password(
             detail="用户不存在"
         )
     
-    user.hashed_password = get_password_hash("123456")  # 重置为默认密码
+    user.hashed_password = DEFAULT_PASSWORD_HASH  # 重置为默认密码（预先计算的哈希）
     await db.commit()
+    invalidate_user_cache(user.id)
     
     return {"success": True, "message": "密码重置成功，新密码为 123456"}
 
-@router.get("/me")
+@router.get("/me", response_model=SuccessResponse[UserSchema])
 async def get_current_user_info(
     current_user: User = Depends(get_current_user)
 ):
@@ -0,0 +1,82 @@
+import asyncio
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import List
+
+from config import config
+from schemas import BatchRequest, BatchRequestItem, BatchResponseItem
+from utils.auth import get_token_user_id
+
+router = APIRouter()
+
+API_PREFIX = "/api"
+
+def _sub_request_path(url: str) -> str:
+    """校验子请求地址并转换为完整路径"""
+    if not url.startswith("/") or url.startswith("//"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"子请求地址无效: {url}"
+        )
+    path = url if url.startswith(API_PREFIX + "/") else API_PREFIX + url
+    # 不允许嵌套批量请求
+    if path.split("?", 1)[0].rstrip("/") == API_PREFIX + "/batch":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="批量请求中不能包含批量请求"
+        )
+    return path
+
+async def _dispatch(client: httpx.AsyncClient, item: BatchRequestItem, path: str, headers: dict) -> BatchResponseItem:
+    """在进程内执行单个子请求"""
+    response = await client.request(
+        item.method,
+        path,
+        json=item.body if item.method in ("POST", "PUT") else None,
+        headers=headers
+    )
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+    else:
+        body = response.text or None
+    return BatchResponseItem(id=item.id, status=response.status_code, body=body)
+
+@router.post("", response_model=None)
+async def batch(
+    batch_request: BatchRequest,
+    request: Request,
+    user_id: int = Depends(get_token_user_id)
+):
+    """批量请求：在一次HTTP请求中并发执行多个API调用（子请求之间不保证执行顺序）
+    
+    批量请求本身只校验令牌、不占用数据库连接，用户状态由各子请求各自校验，
+    避免外层请求持有连接时等待子请求的连接而耗尽连接池
+    """
+    if not batch_request.requests:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="批量请求不能为空"
+        )
+    if len(batch_request.requests) > config.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次批量请求最多包含 {config.BATCH_MAX_REQUESTS} 个子请求"
+        )
+
+    paths = [_sub_request_path(item.url) for item in batch_request.requests]
+
+    # 子请求沿用原请求的认证信息和客户端地址（限流仍按真实客户端计数）
+    headers = {"authorization": request.headers["authorization"]}
+    client_address = (request.client.host, request.client.port) if request.client else ("127.0.0.1", 0)
+    transport = httpx.ASGITransport(
+        app=request.app,
+        raise_app_exceptions=False,
+        client=client_address
+    )
+    async with httpx.AsyncClient(transport=transport, base_url="http://batch") as client:
+        responses: List[BatchResponseItem] = await asyncio.gather(*(
+            _dispatch(client, item, path, headers)
+            for item, path in zip(batch_request.requests, paths)
+        ))
+
+    return {"responses": [response.model_dump() for response in responses]}
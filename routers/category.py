@@ -1,34 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, insert
 from typing import List, Optional
 
 from database import get_db
-from schemas import CategoryCreate, CategoryUpdate, Category as CategorySchema
-from utils.auth import get_current_active_user, get_admin_user
-from models import Category, User, FamilyMember, RecordType
+from schemas import CategoryCreate, CategoryUpdate, CategoryList, SuccessResponse, Category as CategorySchema
+from utils.auth import get_current_active_user, get_admin_user, get_current_family_id
+from models import Category, User, RecordType
+from config import config
+from utils.cache import cache_get, cache_set, category_list_key, invalidate_category_list
 
 router = APIRouter()
 
-async def get_user_family_id(current_user: User, db: AsyncSession) -> Optional[int]:
-    """获取用户所在的家庭ID"""
-    stmt = select(FamilyMember.family_id).where(
-        FamilyMember.user_id == current_user.id,
-        FamilyMember.is_active == True
-    )
-    result = await db.execute(stmt)
-    family_id = result.scalar_one_or_none()
-    return family_id
+# 默认分类（只读，模块加载时构建一次）
+_DEFAULT_CATEGORIES = (
+    # 收入分类
+    {"name": "工资", "type": RecordType.INCOME, "icon": "💰", "color": "#52c41a"},
+    {"name": "奖金", "type": RecordType.INCOME, "icon": "🎁", "color": "#52c41a"},
+    {"name": "投资收益", "type": RecordType.INCOME, "icon": "📈", "color": "#52c41a"},
+    {"name": "兼职收入", "type": RecordType.INCOME, "icon": "💼", "color": "#52c41a"},
+    {"name": "其他收入", "type": RecordType.INCOME, "icon": "💵", "color": "#52c41a"},
+    
+    # 支出分类
+    {"name": "餐饮", "type": RecordType.EXPENSE, "icon": "🍔", "color": "#ff4d4f"},
+    {"name": "交通", "type": RecordType.EXPENSE, "icon": "🚗", "color": "#ff4d4f"},
+    {"name": "购物", "type": RecordType.EXPENSE, "icon": "🛒", "color": "#ff4d4f"},
+    {"name": "娱乐", "type": RecordType.EXPENSE, "icon": "🎮", "color": "#ff4d4f"},
+    {"name": "医疗", "type": RecordType.EXPENSE, "icon": "🏥", "color": "#ff4d4f"},
+    {"name": "教育", "type": RecordType.EXPENSE, "icon": "📚", "color": "#ff4d4f"},
+    {"name": "居住", "type": RecordType.EXPENSE, "icon": "🏠", "color": "#ff4d4f"},
+    {"name": "其他支出", "type": RecordType.EXPENSE, "icon": "💸", "color": "#ff4d4f"},
+)
 
 @router.post("/create", response_model=CategorySchema)
 async def create_category(
     category: CategoryCreate,
     current_user: User = Depends(get_current_active_user),
+    family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """创建分类"""
-    # 获取用户所在家庭
-    family_id = await get_user_family_id(current_user, db)
+    # 用户所在家庭（随当前用户一并加载，无需额外查询）
     if not family_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -66,57 +78,72 @@ async def create_category(
     db.add(db_category)
     await db.commit()
     await db.refresh(db_category)
+    await invalidate_category_list(family_id)
     
     return db_category
 
-@router.get("/list")
+@router.get("/list", response_model=SuccessResponse[CategoryList])
 async def get_categories(
     record_type: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
+    family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """获取分类列表"""
-    # 获取用户所在家庭
-    family_id = await get_user_family_id(current_user, db)
+    # 用户所在家庭（随当前用户一并加载，无需额外查询）
     if not family_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="您还没有加入任何家庭"
         )
     
+    if record_type not in ["income", "expense"]:
+        record_type = None
+    
+    cache_key = category_list_key(family_id, record_type)
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return {"success": True, "data": cached}
+    
     # 构建查询条件
     conditions = [
         Category.family_id == family_id,
         Category.is_active == True
     ]
     
-    if record_type and record_type in ["income", "expense"]:
+    if record_type:
         conditions.append(Category.type == record_type)
     
     stmt = select(Category).where(and_(*conditions)).order_by(Category.name)
     result = await db.execute(stmt)
-    categories = result.scalars().all()
+    categories = [
+        CategorySchema.model_validate(category).model_dump(mode="json")
+        for category in result.scalars().all()
+    ]
     
     # 按类型分组
     income_categories = []
     expense_categories = []
     
     for category in categories:
-        if category.type == RecordType.INCOME:
+        if category["type"] == RecordType.INCOME.value:
             income_categories.append(category)
         else:
             expense_categories.append(category)
     
+    data = {
+        "income": income_categories,
+        "expense": expense_categories,
+        "all": categories
+    }
+    await cache_set(cache_key, data, config.CATEGORY_CACHE_TTL)
+    
     return {
         "success": True,
-        "data": {
-            "income": income_categories,
-            "expense": expense_categories,
-            "all": categories
-        }
+        "data": data
     }
 
-@router.put("/update/{category_id}")
+@router.put("/update/{category_id}", response_model=CategorySchema)
 async def update_category(
     category_id: int,
     category_update: CategoryUpdate,
@@ -145,6 +172,7 @@ async def update_category(
     
     await db.commit()
     await db.refresh(category)
+    await invalidate_category_list(category.family_id)
     
     return category
 
@@ -169,72 +197,54 @@ async def delete_category(
     # 软删除：标记为非活跃
     category.is_active = False
     await db.commit()
+    await invalidate_category_list(category.family_id)
     
     return {"success": True, "message": "分类删除成功"}
 
 @router.post("/init-default")
 async def init_default_categories(
     current_user: User = Depends(get_current_active_user),
+    family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """初始化默认分类"""
-    # 获取用户所在家庭
-    family_id = await get_user_family_id(current_user, db)
+    # 用户所在家庭（随当前用户一并加载，无需额外查询）
     if not family_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="您还没有加入任何家庭"
         )
     
-    # 默认分类
-    default_categories = [
-        # 收入分类
-        {"name": "工资", "type": RecordType.INCOME, "icon": "💰", "color": "#52c41a"},
-        {"name": "奖金", "type": RecordType.INCOME, "icon": "🎁", "color": "#52c41a"},
-        {"name": "投资收益", "type": RecordType.INCOME, "icon": "📈", "color": "#52c41a"},
-        {"name": "兼职收入", "type": RecordType.INCOME, "icon": "💼", "color": "#52c41a"},
-        {"name": "其他收入", "type": RecordType.INCOME, "icon": "💵", "color": "#52c41a"},
-        
-        # 支出分类
-        {"name": "餐饮", "type": RecordType.EXPENSE, "icon": "🍔", "color": "#ff4d4f"},
-        {"name": "交通", "type": RecordType.EXPENSE, "icon": "🚗", "color": "#ff4d4f"},
-        {"name": "购物", "type": RecordType.EXPENSE, "icon": "🛒", "color": "#ff4d4f"},
-        {"name": "娱乐", "type": RecordType.EXPENSE, "icon": "🎮", "color": "#ff4d4f"},
-        {"name": "医疗", "type": RecordType.EXPENSE, "icon": "🏥", "color": "#ff4d4f"},
-        {"name": "教育", "type": RecordType.EXPENSE, "icon": "📚", "color": "#ff4d4f"},
-        {"name": "居住", "type": RecordType.EXPENSE, "icon": "🏠", "color": "#ff4d4f"},
-        {"name": "其他支出", "type": RecordType.EXPENSE, "icon": "💸", "color": "#ff4d4f"},
-    ]
-    
-    created_count = 0
-    
-    for cat_data in default_categories:
-        # 检查是否已存在
-        existing_stmt = select(Category).where(
-            and_(
-                Category.family_id == family_id,
-                Category.name == cat_data["name"],
-                Category.type == cat_data["type"],
-                Category.is_active == True
-            )
+    # 一次性查出已存在的分类，在内存中过滤
+    existing_stmt = select(Category.name, Category.type).where(
+        and_(
+            Category.family_id == family_id,
+            Category.is_active == True
         )
-        existing_result = await db.execute(existing_stmt)
-        existing_category = existing_result.scalar_one_or_none()
-        
-        if not existing_category:
-            # 创建新分类
-            db_category = Category(
-                family_id=family_id,
-                name=cat_data["name"],
-                type=cat_data["type"],
-                icon=cat_data["icon"],
-                color=cat_data["color"],
-                created_by=current_user.id
-            )
-            db.add(db_category)
-            created_count += 1
+    )
+    existing_result = await db.execute(existing_stmt)
+    existing = {(name, category_type) for name, category_type in existing_result.all()}
+    
+    new_categories = [
+        {
+            "family_id": family_id,
+            "name": cat_data["name"],
+            "type": cat_data["type"],
+            "icon": cat_data["icon"],
+            "color": cat_data["color"],
+            "created_by": current_user.id,
+            "is_active": True
+        }
+        for cat_data in _DEFAULT_CATEGORIES
+        if (cat_data["name"], cat_data["type"]) not in existing
+    ]
+    created_count = len(new_categories)
     
-    await db.commit()
+    if new_categories:
+        # 使用Core批量插入，跳过逐行ORM对象构建
+        await db.execute(insert(Category), new_categories)
+        await db.commit()
+        await invalidate_category_list(family_id)
     
     return {
         "success": True, 
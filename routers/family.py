@@ -1,14 +1,18 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, or_, func, case, exists, delete
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 
 from database import get_db
-from schemas import FamilyCreate, FamilyUpdate, FamilyMemberCreate, FamilyMemberWithUser, FamilyWithMembers, Family as FamilySchema
-from utils.auth import get_current_active_user, get_admin_user
+from schemas import FamilyCreate, FamilyUpdate, FamilyMemberCreate, FamilyMemberWithUser, FamilyWithMembers, Statistics, SuccessResponse, Family as FamilySchema
+from utils.auth import get_current_active_user, get_current_family_id, get_admin_user, invalidate_user_cache
+from utils.cache import invalidate_family_members
 from models import Family, FamilyMember, User, AccountRecord, UserRole, RecordType
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 async def get_user_family_id(current_user: User, db: AsyncSession) -> Optional[int]:
     """获取用户所在的家庭ID"""
@@ -60,10 +64,9 @@ async def create_family(
     )
     
     db.add(db_family)
-    await db.commit()
-    await db.refresh(db_family)
+    await db.flush()
     
-    # 创建者自动成为家庭管理员
+    # 创建者自动成为家庭管理员（与家庭在同一事务中提交）
     family_member = FamilyMember(
         family_id=db_family.id,
         user_id=current_user.id,
@@ -71,55 +74,46 @@ async def create_family(
     )
     db.add(family_member)
     await db.commit()
+    await db.refresh(db_family)
+    invalidate_user_cache(current_user.id)
+    await invalidate_family_members(db, db_family.id)
     
     return db_family
 
-@router.get("/my-family")
+@router.get("/my-family", response_model=FamilyWithMembers)
 async def get_my_family(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """获取我所在的家庭"""
     # 查找用户所在的家庭
-    stmt = select(FamilyMember).where(
+    stmt = select(Family).join(
+        FamilyMember, FamilyMember.family_id == Family.id
+    ).where(
         FamilyMember.user_id == current_user.id,
         FamilyMember.is_active == True
     )
     result = await db.execute(stmt)
-    membership = result.scalar_one_or_none()
-    
-    if not membership:
-        raise HTTPException(
-            status_code=404,
-            detail="您还没有加入任何家庭"
-        )
-    
-    # 获取家庭信息
-    family_stmt = select(Family).where(Family.id == membership.family_id)
-    family_result = await db.execute(family_stmt)
-    family = family_result.scalar_one_or_none()
+    family = result.scalar_one_or_none()
     
     if not family:
         raise HTTPException(
             status_code=404,
-            detail="家庭不存在"
+            detail="您还没有加入任何家庭"
         )
     
-    # 获取家庭成员
-    member_stmt = select(FamilyMember).where(
+    # 获取家庭成员及其用户信息
+    member_stmt = select(FamilyMember, User).outerjoin(
+        User, User.id == FamilyMember.user_id
+    ).where(
         FamilyMember.family_id == family.id,
         FamilyMember.is_active == True
     )
     member_result = await db.execute(member_stmt)
-    members = member_result.scalars().all()
     
     # 添加用户信息
     members_with_user = []
-    for member in members:
-        user_stmt = select(User).where(User.id == member.user_id)
-        user_result = await db.execute(user_stmt)
-        user = user_result.scalar_one_or_none()
-        
+    for member, user in member_result.all():
         members_with_user.append(FamilyMemberWithUser(
             id=member.id,
             family_id=member.family_id,
@@ -148,48 +142,44 @@ async def add_family_member(
     db: AsyncSession = Depends(get_db)
 ):
     """添加家庭成员"""
-    # 检查家庭是否存在
-    family_stmt = select(Family).where(Family.id == member_data.family_id)
-    family_result = await db.execute(family_stmt)
-    family = family_result.scalar_one_or_none()
+    # 一次查询同时检查家庭、用户是否存在以及是否已是家庭成员
+    check_stmt = select(
+        exists().where(Family.id == member_data.family_id),
+        exists().where(User.id == member_data.user_id),
+        exists().where(
+            and_(
+                FamilyMember.family_id == member_data.family_id,
+                FamilyMember.user_id == member_data.user_id,
+                FamilyMember.is_active == True
+            )
+        )
+    )
+    check_result = await db.execute(check_stmt)
+    family_exists, user_exists, is_member = check_result.one()
     
-    if not family:
+    if not family_exists:
         raise HTTPException(
             status_code=404,
             detail="家庭不存在"
         )
     
-    # 检查用户是否存在
-    user_stmt = select(User).where(User.id == member_data.user_id)
-    user_result = await db.execute(user_stmt)
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
+    if not user_exists:
         raise HTTPException(
             status_code=404,
             detail="用户不存在"
         )
     
-    # 检查是否已经是家庭成员
-    existing_stmt = select(FamilyMember).where(
-        and_(
-            FamilyMember.family_id == member_data.family_id,
-            FamilyMember.user_id == member_data.user_id,
-            FamilyMember.is_active == True
-        )
-    )
-    existing_result = await db.execute(existing_stmt)
-    existing_member = existing_result.scalar_one_or_none()
-    
-    if existing_member:
+    if is_member:
         raise HTTPException(
             status_code=400,
             detail="该用户已经是家庭成员"
         )
     
     # 创建家庭成员
-    print(f"创建家庭成员: family_id={member_data.family_id}, user_id={member_data.user_id}, role={member_data.role}")
-    print(f"角色类型: {type(member_data.role)}, 值: {member_data.role}")
+    logger.debug(
+        "创建家庭成员 family_id=%s user_id=%s role=%s",
+        member_data.family_id, member_data.user_id, member_data.role
+    )
     
     try:
         family_member = FamilyMember(
@@ -199,13 +189,15 @@ async def add_family_member(
         )
         db.add(family_member)
         await db.commit()
-    except Exception as e:
-        print(f"创建家庭成员失败: {e}")
+    except IntegrityError as e:
+        await db.rollback()
+        logger.debug("创建家庭成员失败: %s", e)
         raise HTTPException(
             status_code=422,
-            detail=f"创建家庭成员失败: {str(e)}"
+            detail=f"创建家庭成员失败: {str(e.orig)}"
         )
-    
+    invalidate_user_cache(member_data.user_id)
+    await invalidate_family_members(db, member_data.family_id)
     
     return {"success": True, "message": "家庭成员添加成功"}
 
@@ -241,10 +233,12 @@ async def remove_family_member(
     # 标记为非活跃（软删除）
     member.is_active = False
     await db.commit()
+    invalidate_user_cache(member.user_id)
+    await invalidate_family_members(db, member.family_id)
     
     return {"success": True, "message": "家庭成员移除成功"}
 
-@router.put("/update/{family_id}")
+@router.put("/update/{family_id}", response_model=FamilySchema)
 async def update_family(
     family_id: int,
     family_update: FamilyUpdate,
@@ -271,6 +265,7 @@ async def update_family(
     
     await db.commit()
     await db.refresh(family)
+    await invalidate_family_members(db, family.id)
     
     return family
 
@@ -280,19 +275,20 @@ async def cleanup_test_members(
     db: AsyncSession = Depends(get_db)
 ):
     """清理测试家庭成员数据"""
-    # 清理非活跃的家庭成员
-    stmt = select(FamilyMember).where(FamilyMember.is_active == False)
+    # 清理非活跃的测试家庭成员（手机号包含 test 或姓名包含“测试”），在数据库中一次删除
+    test_user_ids = select(User.id).where(
+        or_(
+            func.lower(User.phone).contains("test"),
+            User.name.contains("测试")
+        )
+    )
+    stmt = delete(FamilyMember).where(
+        FamilyMember.is_active == False,
+        FamilyMember.user_id.in_(test_user_ids)
+    )
     result = await db.execute(stmt)
-    inactive_members = result.scalars().all()
-    
-    count = 0
-    for member in inactive_members:
-        # 检查是否为测试用户（手机号包含特定标识）
-        if member.user and ('test' in member.user.phone.lower() or '测试' in member.user.name):
-            await db.delete(member)
-            count += 1
-    
     await db.commit()
+    count = result.rowcount
     
     return {"success": True, "message": f"已清理 {count} 个测试家庭成员"}
 
@@ -324,10 +320,9 @@ async def quick_create_family(
     )
     
     db.add(db_family)
-    await db.commit()
-    await db.refresh(db_family)
+    await db.flush()
     
-    # 创建者自动成为家庭管理员
+    # 创建者自动成为家庭管理员（与家庭在同一事务中提交）
     family_member = FamilyMember(
         family_id=db_family.id,
         user_id=current_user.id,
@@ -335,54 +330,33 @@ async def quick_create_family(
     )
     db.add(family_member)
     await db.commit()
+    await db.refresh(db_family)
+    invalidate_user_cache(current_user.id)
+    await invalidate_family_members(db, db_family.id)
     
     return db_family
 
-@router.get("/statistics")
+@router.get("/statistics", response_model=SuccessResponse[Statistics])
 async def get_family_statistics(
-    current_user: User = Depends(get_current_active_user),
+    family_id: Optional[int] = Depends(get_current_family_id),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭统计数据"""
-    from schemas import Statistics, CategoryStats, TrendData, FamilyRanking
-    from datetime import datetime, timedelta
-    
-    # 获取用户所在家庭
-    member_stmt = select(FamilyMember).where(
-        FamilyMember.user_id == current_user.id,
-        FamilyMember.is_active == True
-    )
-    member_result = await db.execute(member_stmt)
-    membership = member_result.scalar_one_or_none()
+    from schemas import CategoryStats, TrendData, FamilyRanking
+    from datetime import datetime
     
-    if not membership:
+    # 用户所在家庭（随当前用户一并加载，无需额外查询）
+    if not family_id:
         raise HTTPException(
             status_code=404,
             detail="您还没有加入任何家庭"
         )
     
-    family_id = membership.family_id
-    
-    # 计算总收入、总支出
-    income_stmt = select(func.sum(AccountRecord.amount)).where(
-        and_(
-            AccountRecord.family_id == family_id,
-            AccountRecord.type == RecordType.INCOME
-        )
-    )
-    expense_stmt = select(func.sum(AccountRecord.amount)).where(
-        and_(
-            AccountRecord.family_id == family_id,
-            AccountRecord.type == RecordType.EXPENSE
-        )
-    )
-    
-    income_result = await db.execute(income_stmt)
-    expense_result = await db.execute(expense_stmt)
-    
-    total_income = income_result.scalar() or 0
-    total_expense = expense_result.scalar() or 0
-    balance = total_income - total_expense
+    # 计算总收入、总支出（条件聚合，一次查询得到两个合计）
+    totals_stmt = select(
+        func.sum(case((AccountRecord.type == RecordType.INCOME, AccountRecord.amount), else_=0)).label("income"),
+        func.sum(case((AccountRecord.type == RecordType.EXPENSE, AccountRecord.amount), else_=0)).label("expense")
+    ).where(AccountRecord.family_id == family_id)
     
     # 按分类统计支出
     expense_category_stmt = select(
@@ -395,18 +369,6 @@ async def get_family_statistics(
         )
     ).group_by(AccountRecord.category)
     
-    expense_category_result = await db.execute(expense_category_stmt)
-    expense_category_rows = expense_category_result.all()
-    
-    expense_by_category = []
-    for category, amount in expense_category_rows:
-        percentage = (amount / total_expense * 100) if total_expense > 0 else 0
-        expense_by_category.append(CategoryStats(
-            category=category,
-            amount=float(amount),
-            percentage=float(percentage)
-        ))
-    
     # 按分类统计收入
     income_category_stmt = select(
         AccountRecord.category,
@@ -418,59 +380,31 @@ async def get_family_statistics(
         )
     ).group_by(AccountRecord.category)
     
-    income_category_result = await db.execute(income_category_stmt)
-    income_category_rows = income_category_result.all()
-    
-    income_by_category = []
-    for category, amount in income_category_rows:
-        percentage = (amount / total_income * 100) if total_income > 0 else 0
-        income_by_category.append(CategoryStats(
-            category=category,
-            amount=float(amount),
-            percentage=float(percentage)
-        ))
-    
-    # 生成趋势数据（最近6个月）
-    trend_data = []
+    # 趋势数据的月份范围（最近6个月），按“年*12+月”的月序号计算，避免跨年分支
     now = datetime.now()
-    for i in range(5, -1, -1):  # 从6个月前到现在
-        month_start = datetime(now.year, now.month - i if now.month - i > 0 else 12, 1)
-        if now.month - i <= 0:
-            month_start = datetime(now.year - 1, now.month - i + 12, 1)
-        
-        month_end = datetime(month_start.year, month_start.month, 1) + timedelta(days=32)
-        month_end = datetime(month_end.year, month_end.month, 1) - timedelta(days=1)
-        
-        # 计算当月收入和支出
-        month_income_stmt = select(func.sum(AccountRecord.amount)).where(
-            and_(
-                AccountRecord.family_id == family_id,
-                AccountRecord.type == RecordType.INCOME,
-                AccountRecord.date >= month_start.date(),
-                AccountRecord.date <= month_end.date()
-            )
-        )
-        
-        month_expense_stmt = select(func.sum(AccountRecord.amount)).where(
-            and_(
-                AccountRecord.family_id == family_id,
-                AccountRecord.type == RecordType.EXPENSE,
-                AccountRecord.date >= month_start.date(),
-                AccountRecord.date <= month_end.date()
-            )
+    current_month = now.year * 12 + now.month - 1
+    months = [
+        datetime(year, month + 1, 1)
+        for year, month in (divmod(current_month - i, 12) for i in range(5, -1, -1))
+    ]
+    end_year, end_month = divmod(current_month + 1, 12)
+    month_end = datetime(end_year, end_month + 1, 1)
+    
+    # 按月份和类型一次性汇总收入和支出
+    record_year = func.extract("year", AccountRecord.date).label("year")
+    record_month = func.extract("month", AccountRecord.date).label("month")
+    monthly_stmt = select(
+        record_year,
+        record_month,
+        AccountRecord.type,
+        func.sum(AccountRecord.amount)
+    ).where(
+        and_(
+            AccountRecord.family_id == family_id,
+            AccountRecord.date >= months[0],
+            AccountRecord.date < month_end
         )
-        
-        month_income_result = await db.execute(month_income_stmt)
-        month_expense_result = await db.execute(month_expense_stmt)
-        
-        month_income = month_income_result.scalar() or 0
-        month_expense = month_expense_result.scalar() or 0
-        
-        trend_data.append(TrendData(
-            date=f"{month_start.year}年{month_start.month}月",
-            income=float(month_income),
-            expense=float(month_expense)
-        ))
+    ).group_by(record_year, record_month, AccountRecord.type)
     
     # 生成家庭排行榜数据
     ranking_stmt = select(
@@ -492,8 +426,46 @@ async def get_family_statistics(
         func.count(AccountRecord.id).desc()
     )
     
-    ranking_result = await db.execute(ranking_stmt)
-    ranking_rows = ranking_result.all()
+    # 在请求会话上依次执行，每个请求只占用一个连接池连接，避免并发扇出耗尽连接池
+    totals_rows = (await db.execute(totals_stmt)).all()
+    expense_category_rows = (await db.execute(expense_category_stmt)).all()
+    income_category_rows = (await db.execute(income_category_stmt)).all()
+    monthly_rows = (await db.execute(monthly_stmt)).all()
+    ranking_rows = (await db.execute(ranking_stmt)).all()
+    
+    total_income = totals_rows[0].income or 0
+    total_expense = totals_rows[0].expense or 0
+    balance = total_income - total_expense
+    
+    expense_by_category = []
+    for category, amount in expense_category_rows:
+        percentage = (amount / total_expense * 100) if total_expense > 0 else 0
+        expense_by_category.append(CategoryStats(
+            category=category,
+            amount=float(amount),
+            percentage=float(percentage)
+        ))
+    
+    income_by_category = []
+    for category, amount in income_category_rows:
+        percentage = (amount / total_income * 100) if total_income > 0 else 0
+        income_by_category.append(CategoryStats(
+            category=category,
+            amount=float(amount),
+            percentage=float(percentage)
+        ))
+    
+    monthly_amounts = {}
+    for year, month, record_type, amount in monthly_rows:
+        monthly_amounts[(int(year), int(month), record_type)] = amount or 0
+    
+    trend_data = []
+    for month_start in months:
+        trend_data.append(TrendData(
+            date=f"{month_start.year}年{month_start.month}月",
+            income=float(monthly_amounts.get((month_start.year, month_start.month, RecordType.INCOME), 0)),
+            expense=float(monthly_amounts.get((month_start.year, month_start.month, RecordType.EXPENSE), 0))
+        ))
     
     family_ranking = []
     for name, record_count, total_amount in ranking_rows:
@@ -1,21 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, exists
+from sqlalchemy.orm import joinedload, raiseload
 from typing import List
 
 from database import get_db
 from schemas import User as UserSchema, UserUpdate
-from utils.auth import get_current_active_user
+from utils.auth import get_current_active_user, invalidate_user_cache
+from utils.cache import cache_get, cache_set, family_members_key, invalidate_family_members
 from models import User
+from config import config
 
 router = APIRouter()
 
-@router.get("/profile", response_model=UserSchema)
+@router.get("/profile", response_model=None)
 async def get_user_profile(
     current_user: User = Depends(get_current_active_user)
 ):
-    """获取用户资料"""
-    return current_user
+    """获取用户资料（字段与 UserSchema 一致，数据来自数据库无需再校验）"""
+    return ORJSONResponse({
+        "id": current_user.id,
+        "phone": current_user.phone,
+        "name": current_user.name,
+        "role": current_user.role,
+        "is_active": current_user.is_active,
+        "created_at": current_user.created_at
+    })
 
 @router.put("/profile", response_model=UserSchema)
 async def update_user_profile(
@@ -26,11 +37,11 @@ async def update_user_profile(
     """更新用户资料"""
     # 检查手机号是否已被其他用户使用
     if user_update.phone and user_update.phone != current_user.phone:
-        stmt = select(User).where(User.phone == user_update.phone)
+        stmt = select(exists().where(User.phone == user_update.phone))
         result = await db.execute(stmt)
-        existing_user = result.scalar_one_or_none()
+        phone_taken = result.scalar()
         
-        if existing_user:
+        if phone_taken:
             raise HTTPException(
                 status_code=400,
                 detail="手机号已被使用"
@@ -42,8 +53,13 @@ async def update_user_profile(
     if user_update.phone:
         current_user.phone = user_update.phone
     
+    # 姓名、手机号会出现在同家庭成员的列表中，提交后需清除这些家庭的成员列表缓存
+    family_ids = [membership.family_id for membership in current_user.family_memberships]
+    
     await db.commit()
     await db.refresh(current_user)
+    invalidate_user_cache(current_user.id)
+    await invalidate_family_members(db, *family_ids)
     
     return current_user
 
@@ -54,66 +70,69 @@ async def get_user_by_phone(
     db: AsyncSession = Depends(get_db)
 ):
     """通过手机号查找用户"""
-    stmt = select(User).where(User.phone == phone)
+    # 只查询需要返回的列，不加载密码哈希等其他字段；已禁用的用户按不存在处理
+    stmt = select(
+        User.id, User.phone, User.name, User.role, User.is_active
+    ).where(User.phone == phone, User.is_active.is_(True))
     result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
+    row = result.first()
     
-    if not user:
+    if not row:
         raise HTTPException(
             status_code=404,
             detail="用户不存在"
         )
     
-    return {
-        "id": user.id,
-        "phone": user.phone,
-        "name": user.name,
-        "role": user.role,
-        "is_active": user.is_active
-    }
+    return dict(row._mapping)
 
-@router.get("/family-members")
+@router.get("/family-members", response_model=None)
 async def get_family_members(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭成员列表"""
-    from sqlalchemy.orm import selectinload
     from models import Family, FamilyMember
     
-    # 查找用户所在的家庭
-    stmt = select(FamilyMember).where(
+    cache_key = family_members_key(current_user.id)
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return ORJSONResponse({"success": True, "data": cached})
+    
+    # 用户所在的家庭
+    user_family_ids = select(FamilyMember.family_id).where(
         FamilyMember.user_id == current_user.id,
         FamilyMember.is_active == True
-    ).options(selectinload(FamilyMember.family))
+    ).scalar_subquery()
+    
+    # 一次查询取出这些家庭的全部成员及其家庭、用户信息
+    stmt = select(FamilyMember).where(
+        FamilyMember.family_id.in_(user_family_ids),
+        FamilyMember.is_active == True
+    ).options(
+        joinedload(FamilyMember.family),
+        joinedload(FamilyMember.user),
+        raiseload("*")
+    ).order_by(FamilyMember.family_id, FamilyMember.id)
     result = await db.execute(stmt)
-    memberships = result.scalars().all()
     
-    members = []
-    for membership in memberships:
-        family = membership.family
-        # 获取该家庭的所有成员
-        member_stmt = select(FamilyMember).where(
-            FamilyMember.family_id == family.id,
-            FamilyMember.is_active == True
-        ).options(selectinload(FamilyMember.user))
-        member_result = await db.execute(member_stmt)
-        family_members = member_result.scalars().all()
-        
-        for member in family_members:
-            members.append({
-                "id": member.id,
-                "family_id": family.id,
-                "family_name": family.name,
-                "user_id": member.user.id,
-                "user_name": member.user.name,
-                "user_phone": member.user.phone,
-                "role": member.role,
-                "joined_at": member.joined_at,
-                "is_active": member.is_active
-            })
+    members = [
+        {
+            "id": member.id,
+            "family_id": member.family_id,
+            "family_name": member.family.name,
+            "user_id": member.user_id,
+            "user_name": member.user.name,
+            "user_phone": member.user.phone,
+            "role": member.role,
+            "joined_at": member.joined_at,
+            "is_active": member.is_active
+        }
+        for member in result.scalars()
+    ]
+    await cache_set(cache_key, members, config.FAMILY_MEMBERS_CACHE_TTL)
     
-    return {
+    # 直接返回ORJSONResponse，跳过jsonable_encoder逐字段转换
+    return ORJSONResponse({
         "success": True,
         "data": members
-    }
\ No newline at end of file
+    })
\ No newline at end of file
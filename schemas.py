@@ -1,8 +1,12 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+import re
+from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
+from typing import Optional, List, Any, Literal, Generic, TypeVar
 from datetime import datetime
 from models import UserRole, RecordType
 
+# 手机号格式：至少11位数字
+_PHONE_RE = re.compile(r"\d{11,}")
+
 # 用户相关
 class UserBase(BaseModel):
     phone: str
@@ -12,9 +16,10 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
     
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
-        if not v.isdigit() or len(v) < 11:
+        if not _PHONE_RE.fullmatch(v):
             raise ValueError('手机号格式不正确')
         return v
 
@@ -26,9 +31,10 @@ class UserUpdate(BaseModel):
     name: Optional[str] = None
     phone: Optional[str] = None
     
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
-        if v and (not v.isdigit() or len(v) < 11):
+        if v and not _PHONE_RE.fullmatch(v):
             raise ValueError('手机号格式不正确')
         return v
 
@@ -44,8 +50,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # 账本记录相关
 class AccountRecordBase(BaseModel):
@@ -70,8 +75,7 @@ class AccountRecord(AccountRecordBase):
     user_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AccountRecordWithUser(AccountRecord):
     user_name: str
@@ -94,8 +98,7 @@ class Family(FamilyBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class FamilyMemberBase(BaseModel):
     user_id: int
@@ -113,8 +116,7 @@ class FamilyMember(FamilyMemberBase):
     joined_at: datetime
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class FamilyMemberWithUser(FamilyMember):
     user_name: str
@@ -186,8 +188,12 @@ class Category(CategoryBase):
     created_by: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class CategoryList(BaseModel):
+    income: List[Category]
+    expense: List[Category]
+    all: List[Category]
 
 # 通用响应
 class Response(BaseModel):
@@ -195,6 +201,27 @@ class Response(BaseModel):
     message: str
     data: Optional[dict] = None
 
+T = TypeVar("T")
+
+class SuccessResponse(BaseModel, Generic[T]):
+    success: bool = True
+    data: T
+
+# 批量请求相关
+class BatchRequestItem(BaseModel):
+    id: str
+    method: Literal["GET", "POST", "PUT", "DELETE"] = "GET"
+    url: str  # 相对于 /api 的路径，如 /category/list
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem]
+
+class BatchResponseItem(BaseModel):
+    id: str
+    status: int
+    body: Optional[Any] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,29 +1,123 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Optional, Tuple
+from cachetools import TTLCache
+import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from config import config
 from database import get_db
-from models import User
+from models import User, FamilyMember
+
+logger = logging.getLogger(__name__)
 
 # 密码加密
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=config.ARGON2_TIME_COST,
+    argon2__memory_cost=config.ARGON2_MEMORY_COST,
+    argon2__parallelism=config.ARGON2_PARALLELISM,
+    bcrypt__rounds=config.BCRYPT_ROUNDS,
+    bcrypt__ident="2b"
+)
 
 # JWT认证
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# JWT解析参数（模块加载时构建一次）
+_JWT_ALGS = [config.ALGORITHM]
+_JWT_DECODE_OPTIONS = {"require": ["exp", "sub"]}
+
+# JWT解析结果缓存，避免同一令牌在短时间内重复验签
+_token_cache = TTLCache(maxsize=config.TOKEN_CACHE_SIZE, ttl=config.TOKEN_CACHE_TTL)
+
+# 登录校验结果缓存，同一用户短时间内以相同密码重复登录时跳过bcrypt
+_verify_cache = TTLCache(maxsize=config.VERIFY_CACHE_SIZE, ttl=config.VERIFY_CACHE_TTL)
+
+def _verify_cache_key(user: User, password: str) -> str:
+    """登录校验缓存键（包含当前密码哈希，修改或重置密码后旧缓存自动失效）"""
+    message = f"{user.id}:{user.hashed_password}:{password}".encode()
+    return hmac.new(config.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+# 当前用户缓存，保存用户及其家庭成员关系的字段快照，省去每次请求的用户查询
+_user_cache = TTLCache(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+
+def _column_values(instance) -> dict:
+    """提取ORM对象的字段值"""
+    return {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
+
+def _cache_user(user: User):
+    """缓存用户及其家庭成员关系"""
+    _user_cache[user.id] = (
+        _column_values(user),
+        [_column_values(membership) for membership in user.family_memberships]
+    )
+
+async def _get_cached_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """从缓存还原用户并合并到当前会话（不查询数据库）"""
+    cached = _user_cache.get(user_id)
+    if cached is None:
+        return None
+    
+    user_values, membership_values = cached
+    user = User(**user_values)
+    make_transient_to_detached(user)
+    memberships = []
+    for values in membership_values:
+        membership = FamilyMember(**values)
+        make_transient_to_detached(membership)
+        memberships.append(membership)
+    set_committed_value(user, "family_memberships", memberships)
+    
+    # 合并到当前会话，路由中对用户的修改仍可正常提交
+    return await db.merge(user, load=False)
+
+def invalidate_user_cache(*user_ids: int):
+    """用户信息或家庭成员关系变更后清除缓存"""
+    for user_id in user_ids:
+        _user_cache.pop(user_id, None)
+
+# 密码哈希专用线程池：哈希为CPU密集型计算，放到独立线程池执行，
+# 既不阻塞事件循环，也不占用其他同步任务共用的默认线程池
+_pwd_executor = ThreadPoolExecutor(
+    max_workers=config.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="pwd-hash"
+)
+
+async def _run_in_pwd_executor(func, *args):
+    """在密码哈希线程池中执行"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pwd_executor, func, *args)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return await _run_in_pwd_executor(pwd_context.verify, plain_password, hashed_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码，哈希需要升级时一并返回新哈希（否则为None）"""
+    return await _run_in_pwd_executor(pwd_context.verify_and_update, plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """获取密码哈希"""
-    return pwd_context.hash(password)
+    return await _run_in_pwd_executor(pwd_context.hash, password)
+
+# 重置密码使用的默认密码及其哈希（模块加载时计算一次）
+# 注意：所有被重置的用户共用同一个盐值和哈希，用户修改密码后即生成各自独立的哈希
+DEFAULT_PASSWORD = "123456"
+DEFAULT_PASSWORD_HASH = pwd_context.hash(DEFAULT_PASSWORD)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """创建访问令牌"""
@@ -41,60 +135,86 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """获取当前用户"""
-    credentials_exception = HTTPException(
+def decode_access_token(token: str) -> dict:
+    """解析访问令牌（带缓存）"""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(key)
+    # 缓存命中但令牌已过期时重新解析，由jwt.decode抛出过期异常
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    
+    payload = jwt.decode(
+        token, config.SECRET_KEY, algorithms=_JWT_ALGS, options=_JWT_DECODE_OPTIONS
+    )
+    _token_cache[key] = payload
+    return payload
+
+def _credentials_exception() -> HTTPException:
+    """令牌无效时的认证异常"""
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    print(f"DEBUG: Received Authorization header: {credentials.credentials[:20]}...")
+
+async def get_token_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> int:
+    """校验访问令牌并返回用户ID（不访问数据库）"""
+    credentials_exception = _credentials_exception()
     
     try:
-        payload = jwt.decode(credentials.credentials, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+        payload = decode_access_token(credentials.credentials)
         user_id_str = payload.get("sub")
         if user_id_str is None:
-            print("DEBUG: No 'sub' in JWT payload")
+            logger.debug("JWT payload 中缺少 sub")
             raise credentials_exception
         # 转换为整数
         user_id = int(user_id_str)
-        print(f"DEBUG: JWT decoded successfully, user_id: {user_id}")
-    except (JWTError, ValueError) as e:
-        print(f"DEBUG: JWT decode error: {e}")
+        logger.debug("JWT 解析成功 user_id=%s", user_id)
+    except (jwt.PyJWTError, ValueError) as e:
+        logger.debug("JWT 解析失败: %s", e)
         raise credentials_exception
-    
-    stmt = select(User).where(User.id == user_id)
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
-    
+    return user_id
+
+async def get_current_user(
+    user_id: int = Depends(get_token_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """获取当前用户"""
+    user = await _get_cached_user(db, user_id)
     if user is None:
-        print(f"DEBUG: User not found with id: {user_id}")
-        raise credentials_exception
+        # 同时加载家庭成员关系，后续获取家庭ID无需再查询
+        stmt = select(User).options(selectinload(User.family_memberships)).where(User.id == user_id)
+        result = await db.execute(stmt)
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            logger.debug("用户不存在 user_id=%s", user_id)
+            raise _credentials_exception()
+        _cache_user(user)
     
     if not user.is_active:
-        print(f"DEBUG: User {user.phone} is not active")
+        logger.debug("用户已禁用 user_id=%s", user.id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
     
-    print(f"DEBUG: User authenticated: {user.phone}, role: {user.role}")
+    logger.debug("用户认证通过 user_id=%s role=%s", user.id, user.role)
     return user
 
-async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
-    """获取当前活跃用户"""
-    if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
-        )
-    return current_user
+# get_current_user 已拒绝非活跃用户，无需再包一层依赖
+get_current_active_user = get_current_user
+
+async def get_current_family_id(
+    current_user: User = Depends(get_current_active_user)
+) -> Optional[int]:
+    """获取当前用户所在的家庭ID（家庭成员关系已随用户一并加载）"""
+    return next(
+        (m.family_id for m in current_user.family_memberships if m.is_active),
+        None
+    )
 
 async def get_admin_user(
     current_user: User = Depends(get_current_active_user)
@@ -111,14 +231,12 @@ async def get_system_admin(
     current_user: User = Depends(get_current_active_user)
 ) -> User:
     """获取系统管理员"""
-    print(f"DEBUG: get_system_admin called with user: {current_user.phone}, role: {current_user.role}")
     if current_user.role != "system_admin":
-        print(f"DEBUG: User role {current_user.role} is not system_admin")
+        logger.debug("非系统管理员 user_id=%s role=%s", current_user.id, current_user.role)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="System admin access required"
         )
-    print(f"DEBUG: System admin access granted for {current_user.phone}")
     return current_user
 
 async def authenticate_user(db: AsyncSession, phone: str, password: str) -> Optional[User]:
@@ -128,10 +246,29 @@ async def authenticate_user(db: AsyncSession, phone: str, password: str) -> Opti
     user = result.scalar_one_or_none()
     
     if not user:
+        # 用户不存在时同样执行一次哈希校验，避免通过响应时间判断手机号是否注册
+        await _run_in_pwd_executor(pwd_context.dummy_verify)
         return None
-    if not user.is_active:
+    if config.VERIFY_CACHE_ENABLED:
+        cache_key = _verify_cache_key(user, password)
+        if cache_key in _verify_cache:
+            return user if user.is_active else None
+    
+    # 密码哈希为CPU密集型计算，放到线程池执行避免阻塞事件循环
+    # 已禁用的用户也先完成校验再返回，各失败分支耗时一致
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not user.is_active:
         return None
     
+    # 旧算法或旧参数生成的哈希在登录成功后升级（新哈希已在校验时一并生成）
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        invalidate_user_cache(user.id)
+    
+    if config.VERIFY_CACHE_ENABLED:
+        _verify_cache[_verify_cache_key(user, password)] = True
+    
     return user
\ No newline at end of file
@@ -0,0 +1,70 @@
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import FamilyMember
+
+# Redis客户端（连接在首次使用时建立）
+redis_client = redis.from_url(
+    config.REDIS_URL,
+    socket_connect_timeout=1,
+    socket_timeout=1
+)
+
+# 管理后台统计缓存键
+ADMIN_SYSTEM_STATS_KEY = "admin:system-stats"
+ADMIN_ALL_FAMILIES_KEY = "admin:all-families"
+
+def category_list_key(family_id: int, record_type: str = None) -> str:
+    """家庭分类列表缓存键（未按类型筛选时为 all）"""
+    return f"cats:{family_id}:{record_type or 'all'}"
+
+def family_members_key(user_id: int) -> str:
+    """用户可见的家庭成员列表缓存键"""
+    return f"fam:{user_id}"
+
+async def cache_get(key: str):
+    """读取缓存，Redis不可用时按未命中处理"""
+    try:
+        cached = await redis_client.get(key)
+    except RedisError:
+        return None
+    if cached is None:
+        return None
+    return orjson.loads(cached)
+
+async def cache_set(key: str, value, expire: int):
+    """写入缓存"""
+    try:
+        await redis_client.set(key, orjson.dumps(value), ex=expire)
+    except RedisError:
+        pass
+
+async def cache_delete(*keys: str):
+    """删除缓存"""
+    try:
+        await redis_client.delete(*keys)
+    except RedisError:
+        pass
+
+async def invalidate_admin_stats():
+    """清除管理后台统计缓存"""
+    await cache_delete(ADMIN_SYSTEM_STATS_KEY, ADMIN_ALL_FAMILIES_KEY)
+
+async def invalidate_category_list(family_id: int):
+    """清除家庭分类列表缓存"""
+    await cache_delete(*(category_list_key(family_id, t) for t in (None, "income", "expense")))
+
+async def invalidate_family_members(db: AsyncSession, *family_ids: int):
+    """家庭成员关系或成员信息变更后，清除这些家庭所有成员的成员列表缓存"""
+    if not family_ids:
+        return
+    result = await db.execute(
+        select(FamilyMember.user_id).where(FamilyMember.family_id.in_(family_ids)).distinct()
+    )
+    user_ids = result.scalars().all()
+    if user_ids:
+        await cache_delete(*(family_members_key(user_id) for user_id in user_ids))
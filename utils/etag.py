@@ -0,0 +1,61 @@
+import xxhash
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """判断 If-None-Match 是否与当前ETag匹配（弱比较）"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+class ETagMiddleware:
+    """为GET请求的成功响应添加ETag，客户端缓存仍有效时返回304且不再发送响应体"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message: Message = {}
+        body_parts = []
+        passthrough = False
+
+        async def send_with_etag(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                # 只处理200响应，其余原样转发
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            etag = f'"{xxhash.xxh64_hexdigest(body)}"'
+            headers = MutableHeaders(scope=start_message)
+            headers["etag"] = etag
+
+            if if_none_match and _etag_matches(if_none_match, etag):
+                del headers["content-length"]
+                del headers["content-type"]
+                await send({**start_message, "status": 304})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,10 @@
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from config import config
+
+# 按客户端IP限流
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=config.RATE_LIMIT_STORAGE_URI
+)